@@ -1,31 +1,65 @@
+import contextlib
+import copy
+import functools
+import importlib.util
 import logging
 import os
-import json
 import glob
 import time
-from typing import Annotated, Optional
-from dataclasses import dataclass
+import uuid
 
-import vtk, qt, ctk, slicer
+import numpy as np
+import vtk, qt, slicer
 from slicer.i18n import tr as _
 from slicer.i18n import translate
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
-from slicer.parameterNodeWrapper import (
-    parameterNodeWrapper,
-    WithinRange,
-)
 from ITKANTsCommon import ITKANTsCommonLogic
 
 from slicer import (
-    vtkMRMLScalarVolumeNode,
     vtkMRMLTransformNode,
     vtkMRMLLinearTransformNode,
     vtkMRMLBSplineTransformNode,
     vtkMRMLGridTransformNode,
 )
 
-from antsRegistrationLib.Widgets.tables import StagesTable, MetricsTable, LevelsTable
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    # compact like orjson
+    _dumps = functools.partial(json.dumps, separators=(",", ":"))
+    _loads = json.loads
+
+@contextlib.contextmanager
+def temporaryTransformFilePath(extension=".h5"):
+    """Provide a unique file path for passing a transform between ITK and MRML, and remove the file afterwards."""
+    tempFilePath = os.path.join(
+        slicer.app.temporaryPath, "tempTransform_{0}{1}".format(uuid.uuid4().hex, extension)
+    )
+    try:
+        yield tempFilePath
+    finally:
+        if os.path.exists(tempFilePath):
+            os.remove(tempFilePath)
+
+@contextlib.contextmanager
+def signalsBlocked(*widgets):
+    """Block the Qt signals of the widgets, and restore their previous blocking state afterwards."""
+    wasBlocked = [widget.blockSignals(True) for widget in widgets]
+    try:
+        yield
+    finally:
+        for widget, blocked in zip(widgets, wasBlocked):
+            widget.blockSignals(blocked)
 
 def itkTransformFromTransformNode(transformNode):
     """Convert the MRML transform node to an ITK transform."""
@@ -34,51 +68,103 @@ def itkTransformFromTransformNode(transformNode):
     if not transformNode:
         return None
 
-    tempFilePath = os.path.join(
-        slicer.app.temporaryPath,
-        "tempTransform_{0}.h5".format(time.time()),
-    )
-    storageNode = slicer.vtkMRMLTransformStorageNode()
-    storageNode.SetFileName(tempFilePath)
-    storageNode.WriteData(transformNode)
-    itkTransform = itk.transformread(tempFilePath)
-    os.remove(tempFilePath)
+    with temporaryTransformFilePath() as tempFilePath:
+        storageNode = slicer.vtkMRMLTransformStorageNode()
+        storageNode.SetFileName(tempFilePath)
+        storageNode.WriteData(transformNode)
+        itkTransform = itk.transformread(tempFilePath)
     if len(itkTransform) == 1:
         itkTransform = itkTransform[0]
     return itkTransform
 
+def itkImageViewFromVolume(volumeNode):
+    """Create an ITK image that shares the voxel buffer of the volume node instead of copying it.
+    Returns the image and the numpy array it views, which must be kept alive while the image is used.
+    """
+    import itk
+
+    array = slicer.util.arrayFromVolume(volumeNode)
+    image = itk.GetImageViewFromArray(array)
+
+    ijkToRAS = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASMatrix(ijkToRAS)
+    ijkToLPS = slicer.util.arrayFromVTKMatrix(ijkToRAS)
+    ijkToLPS[0:2, :] *= -1  # ITK uses LPS coordinates
+    spacing = np.linalg.norm(ijkToLPS[0:3, 0:3], axis=0)
+    image.SetOrigin(ijkToLPS[0:3, 3].tolist())
+    image.SetSpacing(spacing.tolist())
+    image.SetDirection(itk.matrix_from_array(ijkToLPS[0:3, 0:3] / spacing))
+    return image, array
+
+@functools.lru_cache(maxsize=1)
+def itkTransformNodeClasses():
+    """ITK transform base classes and the MRML transform node class to create for each.
+    Cached so the itk module attributes are only looked up once, after itk is first imported.
+    """
+    import itk
+
+    return (
+        (itk.MatrixOffsetTransformBase, vtkMRMLLinearTransformNode),
+        (itk.BSplineTransform, vtkMRMLBSplineTransformNode),
+        (itk.DisplacementFieldTransform, vtkMRMLGridTransformNode),
+        (itk.CompositeTransform, vtkMRMLTransformNode),
+    )
+
+# MRML transform node class for each concrete ITK transform type converted so far
+_transformNodeClassByItkType = {}
+
+def transformNodeClassForItkTransform(itkTransform):
+    """Return the MRML transform node class to create for the ITK transform."""
+    itkTransformType = type(itkTransform)
+    transformNodeClass = _transformNodeClassByItkType.get(itkTransformType)
+    if transformNodeClass is None:
+        for itkTransformClass, transformNodeClass in itkTransformNodeClasses():
+            if isinstance(itkTransform, itkTransformClass):
+                break
+        else:
+            raise ValueError("Unsupported transform type: {0}".format(itkTransformType))
+        _transformNodeClassByItkType[itkTransformType] = transformNodeClass
+    return transformNodeClass
+
 def transformNodeFromItkTransform(itkTransform, transformNode=None):
     """Convert the ITK transform to a MRML transform node."""
     import itk
 
     if not transformNode:
-        if isinstance(itkTransform, itk.MatrixOffsetTransformBase):
-            transformNode = slicer.vtkMRMLLinearTransformNode()
-            slicer.mrmlScene.AddNode(transformNode)
-        elif isinstance(itkTransform, itk.BSplineTransform):
-            transformNode = slicer.vtkMRMLBSplineTransformNode()
-            slicer.mrmlScene.AddNode(transformNode)
-        elif isinstance(itkTransform, itk.DisplacementFieldTransform):
-            transformNode = slicer.vtkMRMLGridTransformNode()
-            slicer.mrmlScene.AddNode(transformNode)
-        elif isinstance(itkTransform, itk.CompositeTransform):
-            transformNode = slicer.vtkMRMLTransformNode()
-            slicer.mrmlScene.AddNode(transformNode)
-        else:
-            raise ValueError("Unsupported transform type: {0}".format(type(itkTransform)))
+        transformNode = transformNodeClassForItkTransform(itkTransform)()
+        slicer.mrmlScene.AddNode(transformNode)
 
-    tempFilePath = os.path.join(
-        slicer.app.temporaryPath,
-        "tempTransform_{0}.h5".format(time.time()),
-    )
-    itk.transformwrite(itkTransform, tempFilePath)
-    storageNode = slicer.vtkMRMLTransformStorageNode()
-    storageNode.SetFileName(tempFilePath)
-    storageNode.ReadData(transformNode, True)
-    os.remove(tempFilePath)
+    with temporaryTransformFilePath() as tempFilePath:
+        itk.transformwrite(itkTransform, tempFilePath)
+        storageNode = slicer.vtkMRMLTransformStorageNode()
+        storageNode.SetFileName(tempFilePath)
+        storageNode.ReadData(transformNode, True)
 
     return transformNode
 
+# Coarse-to-fine schedule used for stages that do not define any levels
+DEFAULT_LEVEL_STEPS = [
+    {"convergence": 1000, "smoothingSigmas": 3, "shrinkFactors": 8},
+    {"convergence": 500, "smoothingSigmas": 2, "shrinkFactors": 4},
+    {"convergence": 250, "smoothingSigmas": 1, "shrinkFactors": 2},
+    {"convergence": 100, "smoothingSigmas": 0, "shrinkFactors": 1},
+]
+
+# ANTs metric names and the corresponding FireANTs loss types
+FIREANTS_LOSS_TYPES = {
+    "CC": "cc",
+    "MI": "mi",
+    "Mattes": "mi",
+    "MeanSquares": "mse",
+}
+
+# Transforms that FireANTs can chain, in the order they have to appear in the stages
+FIREANTS_TRANSFORMS = ("Rigid", "Affine", "SyN")
+
+# Checked without importing fireants, which imports torch
+_HAS_FIREANTS = importlib.util.find_spec("fireants") is not None
+
+
 class ANTsRegistration(ScriptedLoadableModule):
     """Uses ScriptedLoadableModule base class, available at:
     https://github.com/Slicer/Slicer/blob/main/Base/Python/slicer/ScriptedLoadableModule.py
@@ -120,6 +206,13 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.logic = None
         self._parameterNode = None
         self._updatingGUIFromParameterNode = False
+        self._lastCanApply = None
+        self._updateTimer = None
+        self._parameterNodeUpdatePending = False
+        self._stagesParameterUpdatePending = False
+        self._fixedMovingNodesUpdatePending = False
+        self._presetManager = PresetManager()
+        self._lastParamHash = None
 
     def setEditedNode(self, node, role="", context=""):
         self.setParameterNode(node)
@@ -136,6 +229,13 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         """
         Called when the user opens the module the first time and the widget is initialized.
         """
+        # Imported here so that using the logic without the GUI does not load the table widgets
+        from antsRegistrationLib.Widgets.tables import (
+            StagesTable,
+            MetricsTable,
+            LevelsTable,
+        )
+
         ScriptedLoadableModuleWidget.setup(self)
 
         # Load widget from .ui file (created by Qt Designer).
@@ -175,7 +275,7 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.logic = ANTsRegistrationLogic()
 
         self.ui.stagesPresetsComboBox.addItems(
-            ["Select..."] + PresetManager().getPresetNames()
+            ["Select..."] + self._presetManager.getPresetNames()
         )
         self.ui.openPresetsDirectoryButton.clicked.connect(
             self.onOpenPresetsDirectoryButtonClicked
@@ -191,43 +291,50 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             slicer.mrmlScene, slicer.mrmlScene.EndCloseEvent, self.onSceneEndClose
         )
 
+        # GUI changes are collected for a short time and then written to the parameter node at once,
+        # so that dragging a slider or typing into a spin box does not update the parameter node on every step.
+        self._updateTimer = qt.QTimer()
+        self._updateTimer.setSingleShot(True)
+        self._updateTimer.setInterval(100)
+        self._updateTimer.timeout.connect(self.flushParameterNodeUpdate)
+
         # These connections ensure that whenever user changes some settings on the GUI, that is saved in the MRML scene
         # (in the selected parameter node).
         self.ui.parameterNodeSelector.connect(
             "currentNodeChanged(vtkMRMLNode*)", self.setParameterNode
         )
         self.ui.stagesTableWidget.view.selectionModel().selectionChanged.connect(
-            self.updateParameterNodeFromGUI
+            self.onStageSelectionChanged
         )
         self.ui.outputInterpolationComboBox.connect(
-            "currentIndexChanged(int)", self.updateParameterNodeFromGUI
+            "currentIndexChanged(int)", self.scheduleParameterNodeUpdate
         )
         self.ui.outputTransformComboBox.connect(
-            "currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI
+            "currentNodeChanged(vtkMRMLNode*)", self.scheduleParameterNodeUpdate
         )
         self.ui.outputVolumeComboBox.connect(
-            "currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI
+            "currentNodeChanged(vtkMRMLNode*)", self.scheduleParameterNodeUpdate
         )
         self.ui.initialTransformTypeComboBox.connect(
-            "currentIndexChanged(int)", self.updateParameterNodeFromGUI
+            "currentIndexChanged(int)", self.scheduleParameterNodeUpdate
         )
         self.ui.initialTransformNodeComboBox.connect(
-            "currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI
+            "currentNodeChanged(vtkMRMLNode*)", self.scheduleParameterNodeUpdate
         )
         self.ui.dimensionalitySpinBox.connect(
-            "valueChanged(int)", self.updateParameterNodeFromGUI
+            "valueChanged(int)", self.scheduleParameterNodeUpdate
         )
         self.ui.histogramMatchingCheckBox.connect(
-            "toggled(bool)", self.updateParameterNodeFromGUI
+            "toggled(bool)", self.scheduleParameterNodeUpdate
         )
         self.ui.outputDisplacementFieldCheckBox.connect(
-            "toggled(bool)", self.updateParameterNodeFromGUI
+            "toggled(bool)", self.scheduleParameterNodeUpdate
         )
         self.ui.winsorizeRangeWidget.connect(
-            "valuesChanged(double,double)", self.updateParameterNodeFromGUI
+            "valuesChanged(double,double)", self.scheduleParameterNodeUpdate
         )
         self.ui.computationPrecisionComboBox.connect(
-            "currentIndexChanged(int)", self.updateParameterNodeFromGUI
+            "currentIndexChanged(int)", self.scheduleParameterNodeUpdate
         )
 
         self.ui.fixedImageNodeComboBox.connect(
@@ -242,43 +349,43 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self.onRemoveStageButtonClicked
         )
         self.ui.metricsTableWidget.removeButton.clicked.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.levelsTableWidget.removeButton.clicked.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.stagesTableWidget.model.itemChanged.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.metricsTableWidget.model.itemChanged.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.levelsTableWidget.model.itemChanged.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.fixedMaskComboBox.connect(
-            "currentNodeChanged(vtkMRMLNode*)", self.updateStagesParameterFromGUI
+            "currentNodeChanged(vtkMRMLNode*)", self.scheduleStagesParameterUpdate
         )
         self.ui.movingMaskComboBox.connect(
-            "currentNodeChanged(vtkMRMLNode*)", self.updateStagesParameterFromGUI
+            "currentNodeChanged(vtkMRMLNode*)", self.scheduleStagesParameterUpdate
         )
         self.ui.levelsTableWidget.smoothingSigmasUnitComboBox.currentTextChanged.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.levelsTableWidget.convergenceThresholdSpinBox.valueChanged.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.levelsTableWidget.convergenceWindowSizeSpinBox.valueChanged.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.metricsTableWidget.linkStagesPushButton.toggled.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.levelsTableWidget.linkStagesPushButton.toggled.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
         self.ui.linkMaskingStagesPushButton.toggled.connect(
-            self.updateStagesParameterFromGUI
+            self.scheduleStagesParameterUpdate
         )
 
         # Preset Stages
@@ -309,6 +416,8 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         """
         Called when the application closes and the module widget is destroyed.
         """
+        if self._updateTimer is not None:
+            self._updateTimer.stop()
         self.removeObservers()
 
     def enter(self):
@@ -363,6 +472,9 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         Observation is needed because when the parameter node is changed then the GUI must be updated immediately.
         """
 
+        # pending GUI changes belong to the previous parameter node
+        self.flushParameterNodeUpdate()
+
         if inputParameterNode:
             self.logic.setDefaultParameters(inputParameterNode)
 
@@ -383,15 +495,14 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 self.updateGUIFromParameterNode,
             )
 
-        wasBlocked = self.ui.parameterNodeSelector.blockSignals(True)
-        self.ui.parameterNodeSelector.setCurrentNode(self._parameterNode)
-        self.ui.parameterNodeSelector.blockSignals(wasBlocked)
-
-        wasBlocked = self.ui.stagesPresetsComboBox.blockSignals(True)
-        self.ui.stagesPresetsComboBox.setCurrentIndex(0)
-        self.ui.stagesPresetsComboBox.blockSignals(wasBlocked)
+        with signalsBlocked(
+            self.ui.parameterNodeSelector, self.ui.stagesPresetsComboBox
+        ):
+            self.ui.parameterNodeSelector.setCurrentNode(self._parameterNode)
+            self.ui.stagesPresetsComboBox.setCurrentIndex(0)
 
         # Initial GUI update
+        self._lastParamHash = None
         self.updateGUIFromParameterNode()
 
     def updateGUIFromParameterNode(self, caller=None, event=None):
@@ -403,74 +514,101 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
 
-        # Make sure GUI changes do not call updateParameterNodeFromGUI (it could cause infinite loop)
-        self._updatingGUIFromParameterNode = True
+        p = self.logic.params
+        pn = self._parameterNode
 
-        currentStage = int(
-            self._parameterNode.GetParameter(self.logic.params.CURRENT_STAGE_PARAM)
-        )
-        self.ui.stagesTableWidget.view.setCurrentIndex(
-            self.ui.stagesTableWidget.model.index(currentStage, 0)
-        )
-        self.ui.stagePropertiesCollapsibleButton.text = (
-            "Stage " + str(currentStage + 1) + " Properties"
+        # Read all values from the parameter node at once
+        parameters = {name: pn.GetParameter(name) for name in p.ALL_PARAMS}
+        references = {role: pn.GetNodeReference(role) for role in p.ALL_REFS}
+        # Nothing to update if the modification did not change any of the module parameters
+        paramHash = hash(
+            tuple(parameters.values())
+            + tuple(node.GetID() if node else None for node in references.values())
         )
-        self.updateStagesGUIFromParameter()
+        if paramHash == self._lastParamHash:
+            return
 
-        self.ui.outputTransformComboBox.setCurrentNode(
-            self._parameterNode.GetNodeReference(self.logic.params.OUTPUT_TRANSFORM_REF)
-        )
-        self.ui.outputVolumeComboBox.setCurrentNode(
-            self._parameterNode.GetNodeReference(self.logic.params.OUTPUT_VOLUME_REF)
-        )
-        self.ui.outputInterpolationComboBox.currentText = (
-            self._parameterNode.GetParameter(
-                self.logic.params.OUTPUT_INTERPOLATION_PARAM
-            )
-        )
-        self.ui.outputDisplacementFieldCheckBox.checked = int(
-            self._parameterNode.GetParameter(
-                self.logic.params.CREATE_DISPLACEMENT_FIELD_PARAM
-            )
-        )
+        # Make sure GUI changes do not call updateParameterNodeFromGUI (it could cause infinite loop)
+        self._updatingGUIFromParameterNode = True
+        wasModified = pn.StartModify()
+        try:
+            # Block widget signals while they are set. The tables rely on the guard above instead,
+            # blocking their models would leave the views out of date.
+            with signalsBlocked(
+                self.ui.fixedImageNodeComboBox,
+                self.ui.movingImageNodeComboBox,
+                self.ui.fixedMaskComboBox,
+                self.ui.movingMaskComboBox,
+                self.ui.outputTransformComboBox,
+                self.ui.outputVolumeComboBox,
+                self.ui.outputInterpolationComboBox,
+                self.ui.outputDisplacementFieldCheckBox,
+                self.ui.initialTransformTypeComboBox,
+                self.ui.initialTransformNodeComboBox,
+                self.ui.dimensionalitySpinBox,
+                self.ui.histogramMatchingCheckBox,
+                self.ui.winsorizeRangeWidget,
+                self.ui.computationPrecisionComboBox,
+            ):
+                currentStage = int(parameters[p.CURRENT_STAGE_PARAM])
+                self.ui.stagesTableWidget.view.setCurrentIndex(
+                    self.ui.stagesTableWidget.model.index(currentStage, 0)
+                )
+                self.ui.stagePropertiesCollapsibleButton.text = (
+                    "Stage " + str(currentStage + 1) + " Properties"
+                )
+                self.updateStagesGUIFromParameter(parameters[p.STAGES_JSON_PARAM])
 
-        self.ui.initialTransformTypeComboBox.currentIndex = (
-            int(
-                self._parameterNode.GetParameter(
-                    self.logic.params.INITIALIZATION_FEATURE_PARAM
+                self.ui.outputTransformComboBox.setCurrentNode(
+                    references[p.OUTPUT_TRANSFORM_REF]
+                )
+                self.ui.outputVolumeComboBox.setCurrentNode(
+                    references[p.OUTPUT_VOLUME_REF]
+                )
+                self.ui.outputInterpolationComboBox.currentText = parameters[
+                    p.OUTPUT_INTERPOLATION_PARAM
+                ]
+                self.ui.outputDisplacementFieldCheckBox.checked = int(
+                    parameters[p.CREATE_DISPLACEMENT_FIELD_PARAM]
                 )
-            )
-            + 2
-        )
-        self.ui.initialTransformNodeComboBox.setCurrentNode(
-            self._parameterNode.GetNodeReference(
-                self.logic.params.INITIAL_TRANSFORM_REF
-            )
-            if self.ui.initialTransformTypeComboBox.currentIndex == 1
-            else None
-        )
-        self.ui.initialTransformNodeComboBox.enabled = (
-            self.ui.initialTransformTypeComboBox.currentIndex == 1
-        )
 
-        self.ui.dimensionalitySpinBox.value = int(
-            self._parameterNode.GetParameter(self.logic.params.DIMENSIONALITY_PARAM)
-        )
-        self.ui.histogramMatchingCheckBox.checked = int(
-            self._parameterNode.GetParameter(self.logic.params.HISTOGRAM_MATCHING_PARAM)
-        )
-        winsorizeIntensities = self._parameterNode.GetParameter(
-            self.logic.params.WINSORIZE_IMAGE_INTENSITIES_PARAM
-        ).split(",")
-        self.ui.winsorizeRangeWidget.setMinimumValue(float(winsorizeIntensities[0]))
-        self.ui.winsorizeRangeWidget.setMaximumValue(float(winsorizeIntensities[1]))
-        self.ui.computationPrecisionComboBox.currentText = (
-            self._parameterNode.GetParameter(
-                self.logic.params.COMPUTATION_PRECISION_PARAM
-            )
-        )
+                self.ui.initialTransformTypeComboBox.currentIndex = (
+                    int(parameters[p.INITIALIZATION_FEATURE_PARAM]) + 2
+                )
+                self.ui.initialTransformNodeComboBox.setCurrentNode(
+                    references[p.INITIAL_TRANSFORM_REF]
+                    if self.ui.initialTransformTypeComboBox.currentIndex == 1
+                    else None
+                )
+                self.ui.initialTransformNodeComboBox.enabled = (
+                    self.ui.initialTransformTypeComboBox.currentIndex == 1
+                )
 
-        self.ui.runRegistrationButton.enabled = (
+                self.ui.dimensionalitySpinBox.value = int(
+                    parameters[p.DIMENSIONALITY_PARAM]
+                )
+                self.ui.histogramMatchingCheckBox.checked = int(
+                    parameters[p.HISTOGRAM_MATCHING_PARAM]
+                )
+                winsorizeIntensities = parameters[
+                    p.WINSORIZE_IMAGE_INTENSITIES_PARAM
+                ].split(",")
+                self.ui.winsorizeRangeWidget.setMinimumValue(
+                    float(winsorizeIntensities[0])
+                )
+                self.ui.winsorizeRangeWidget.setMaximumValue(
+                    float(winsorizeIntensities[1])
+                )
+                self.ui.computationPrecisionComboBox.currentText = parameters[
+                    p.COMPUTATION_PRECISION_PARAM
+                ]
+            self._lastParamHash = paramHash
+        finally:
+            pn.EndModify(wasModified)
+            # All the GUI updates are done
+            self._updatingGUIFromParameterNode = False
+
+        canApply = bool(
             self.ui.fixedImageNodeComboBox.currentNodeID
             and self.ui.movingImageNodeComboBox.currentNodeID
             and (
@@ -478,14 +616,12 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 or self.ui.outputVolumeComboBox.currentNodeID
             )
         )
+        if canApply != self._lastCanApply:
+            self.ui.runRegistrationButton.enabled = canApply
+            self._lastCanApply = canApply
 
-        # All the GUI updates are done
-        self._updatingGUIFromParameterNode = False
-
-    def updateStagesGUIFromParameter(self):
-        stagesList = json.loads(
-            self._parameterNode.GetParameter(self.logic.params.STAGES_JSON_PARAM)
-        )
+    def updateStagesGUIFromParameter(self, stagesJson=None):
+        stagesList = self._getStages(stagesJson)
         self.ui.fixedImageNodeComboBox.setCurrentNodeID(
             stagesList[0]["metrics"][0]["fixed"]
         )
@@ -503,19 +639,66 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         currentStage = int(
             self._parameterNode.GetParameter(self.logic.params.CURRENT_STAGE_PARAM)
         )
-        if {"metrics", "levels", "masks"} <= set(stagesList[currentStage].keys()):
-            self.ui.metricsTableWidget.setGUIFromParameters(
-                stagesList[currentStage]["metrics"]
-            )
-            self.ui.levelsTableWidget.setGUIFromParameters(
-                stagesList[currentStage]["levels"]
-            )
-            self.ui.fixedMaskComboBox.setCurrentNodeID(
-                stagesList[currentStage]["masks"]["fixed"]
-            )
-            self.ui.movingMaskComboBox.setCurrentNodeID(
-                stagesList[currentStage]["masks"]["moving"]
-            )
+        stage = stagesList[currentStage]
+        if "metrics" in stage and "levels" in stage and "masks" in stage:
+            self.ui.metricsTableWidget.setGUIFromParameters(stage["metrics"])
+            self.ui.levelsTableWidget.setGUIFromParameters(stage["levels"])
+            self.ui.fixedMaskComboBox.setCurrentNodeID(stage["masks"]["fixed"])
+            self.ui.movingMaskComboBox.setCurrentNodeID(stage["masks"]["moving"])
+
+    def scheduleParameterNodeUpdate(self, caller=None, event=None):
+        """
+        Called when the user changes a general setting in the GUI.
+        The parameter node is updated when the update timer expires.
+        """
+        if self._parameterNode is None or self._updatingGUIFromParameterNode:
+            return
+        self._parameterNodeUpdatePending = True
+        self._updateTimer.start()
+
+    def scheduleStagesParameterUpdate(self, caller=None, event=None):
+        """
+        Called when the user changes a stage, metric, level or mask setting in the GUI.
+        The stages parameter is updated when the update timer expires.
+        """
+        if self._parameterNode is None or self._updatingGUIFromParameterNode:
+            return
+        self._stagesParameterUpdatePending = True
+        self._updateTimer.start()
+
+    def flushParameterNodeUpdate(self):
+        """
+        Write all pending GUI changes into the parameter node in a single batch.
+        """
+        if self._updateTimer is not None:
+            self._updateTimer.stop()
+        updateStages = self._stagesParameterUpdatePending
+        updateFixedMovingNodes = self._fixedMovingNodesUpdatePending
+        updateParameters = self._parameterNodeUpdatePending
+        self._stagesParameterUpdatePending = False
+        self._fixedMovingNodesUpdatePending = False
+        self._parameterNodeUpdatePending = False
+        if self._parameterNode is None or not (
+            updateStages or updateFixedMovingNodes or updateParameters
+        ):
+            return
+        wasModified = self._parameterNode.StartModify()
+        try:
+            # Stages first: the edited stage properties belong to the stage that was current
+            # before a possible change of the current stage.
+            if updateStages or updateFixedMovingNodes:
+                self.updateStagesParameterFromGUI(updateStages, updateFixedMovingNodes)
+            if updateParameters:
+                self.updateParameterNodeFromGUI()
+        finally:
+            self._parameterNode.EndModify(wasModified)
+
+    def onStageSelectionChanged(self):
+        if self._parameterNode is None or self._updatingGUIFromParameterNode:
+            return
+        # Pending changes are for the previously selected stage, write them before switching
+        self.flushParameterNodeUpdate()
+        self.updateParameterNodeFromGUI()
 
     def updateParameterNodeFromGUI(self, caller=None, event=None):
         """
@@ -526,51 +709,52 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
 
-        wasModified = (
-            self._parameterNode.StartModify()
-        )  # Modify all properties in a single batch
+        p = self.logic.params
+        pn = self._parameterNode
 
-        self._parameterNode.SetParameter(
-            self.logic.params.CURRENT_STAGE_PARAM,
+        wasModified = pn.StartModify()  # Modify all properties in a single batch
+
+        pn.SetParameter(
+            p.CURRENT_STAGE_PARAM,
             str(self.ui.stagesTableWidget.getSelectedRow()),
         )
 
-        self._parameterNode.SetNodeReferenceID(
-            self.logic.params.OUTPUT_TRANSFORM_REF,
+        pn.SetNodeReferenceID(
+            p.OUTPUT_TRANSFORM_REF,
             self.ui.outputTransformComboBox.currentNodeID,
         )
-        self._parameterNode.SetNodeReferenceID(
-            self.logic.params.OUTPUT_VOLUME_REF,
+        pn.SetNodeReferenceID(
+            p.OUTPUT_VOLUME_REF,
             self.ui.outputVolumeComboBox.currentNodeID,
         )
-        self._parameterNode.SetParameter(
-            self.logic.params.OUTPUT_INTERPOLATION_PARAM,
+        pn.SetParameter(
+            p.OUTPUT_INTERPOLATION_PARAM,
             self.ui.outputInterpolationComboBox.currentText,
         )
-        self._parameterNode.SetParameter(
-            self.logic.params.CREATE_DISPLACEMENT_FIELD_PARAM,
+        pn.SetParameter(
+            p.CREATE_DISPLACEMENT_FIELD_PARAM,
             str(int(self.ui.outputDisplacementFieldCheckBox.checked)),
         )
 
-        self._parameterNode.SetParameter(
-            self.logic.params.INITIALIZATION_FEATURE_PARAM,
+        pn.SetParameter(
+            p.INITIALIZATION_FEATURE_PARAM,
             str(self.ui.initialTransformTypeComboBox.currentIndex - 2),
         )
-        self._parameterNode.SetNodeReferenceID(
-            self.logic.params.INITIAL_TRANSFORM_REF,
+        pn.SetNodeReferenceID(
+            p.INITIAL_TRANSFORM_REF,
             self.ui.initialTransformNodeComboBox.currentNodeID,
         )
 
-        self._parameterNode.SetParameter(
-            self.logic.params.DIMENSIONALITY_PARAM,
+        pn.SetParameter(
+            p.DIMENSIONALITY_PARAM,
             str(self.ui.dimensionalitySpinBox.value),
         )
-        self._parameterNode.SetParameter(
-            self.logic.params.HISTOGRAM_MATCHING_PARAM,
+        pn.SetParameter(
+            p.HISTOGRAM_MATCHING_PARAM,
             str(int(self.ui.histogramMatchingCheckBox.checked)),
         )
-        self._parameterNode.SetParameter(
-            self.logic.params.WINSORIZE_IMAGE_INTENSITIES_PARAM,
+        pn.SetParameter(
+            p.WINSORIZE_IMAGE_INTENSITIES_PARAM,
             ",".join(
                 [
                     str(self.ui.winsorizeRangeWidget.minimumValue),
@@ -578,39 +762,54 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 ]
             ),
         )
-        self._parameterNode.SetParameter(
-            self.logic.params.COMPUTATION_PRECISION_PARAM,
+        pn.SetParameter(
+            p.COMPUTATION_PRECISION_PARAM,
             self.ui.computationPrecisionComboBox.currentText,
         )
 
-        self._parameterNode.EndModify(wasModified)
+        pn.EndModify(wasModified)
 
     def updateStagesFromFixedMovingNodes(self):
+        """
+        Called when the user selects another fixed or moving image.
+        The stages are updated when the update timer expires.
+        """
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
-        stagesList = json.loads(
-            self._parameterNode.GetParameter(self.logic.params.STAGES_JSON_PARAM)
-        )
-        for stage in stagesList:
-            stage["metrics"][0]["fixed"] = self.ui.fixedImageNodeComboBox.currentNodeID
-            stage["metrics"][0][
-                "moving"
-            ] = self.ui.movingImageNodeComboBox.currentNodeID
-        self._parameterNode.SetParameter(
-            self.logic.params.STAGES_JSON_PARAM, json.dumps(stagesList)
-        )
+        self._fixedMovingNodesUpdatePending = True
+        self._updateTimer.start()
 
-    def updateStagesParameterFromGUI(self):
+    def updateStagesParameterFromGUI(self, fromTables=True, fromFixedMovingNodes=False):
         if self._parameterNode is None or self._updatingGUIFromParameterNode:
             return
-        stagesList = json.loads(
-            self._parameterNode.GetParameter(self.logic.params.STAGES_JSON_PARAM)
-        )
-        self.setStagesTransformsToStagesList(stagesList)
-        self.setCurrentStagePropertiesToStagesList(stagesList)
-        self._parameterNode.SetParameter(
-            self.logic.params.STAGES_JSON_PARAM, json.dumps(stagesList)
-        )
+        # the cached stages are updated in place and serialized once
+        stagesList = self._getStages()
+        if fromTables:
+            self.setStagesTransformsToStagesList(stagesList)
+            self.setCurrentStagePropertiesToStagesList(stagesList)
+        # after the tables, as the metrics table may still show the previous images
+        if fromFixedMovingNodes:
+            self.setFixedMovingNodesToStagesList(stagesList)
+        self._setStages(stagesList)
+
+    def setFixedMovingNodesToStagesList(self, stagesList):
+        fixedNodeID = self.ui.fixedImageNodeComboBox.currentNodeID
+        movingNodeID = self.ui.movingImageNodeComboBox.currentNodeID
+        for stage in stagesList:
+            stage["metrics"][0]["fixed"] = fixedNodeID
+            stage["metrics"][0]["moving"] = movingNodeID
+
+    def _getStages(self, stagesJson=None):
+        """
+        Return the cached stages list of the parameter node.
+        """
+        return self.logic.getStages(self._parameterNode, stagesJson)
+
+    def _setStages(self, stagesList):
+        """
+        Store the stages list in the parameter node.
+        """
+        self.logic.setStages(self._parameterNode, stagesList)
 
     def setStagesTransformsToStagesList(self, stagesList):
         for stageNumber, transformParameters in enumerate(
@@ -625,41 +824,41 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self._parameterNode.GetParameter(self.logic.params.CURRENT_STAGE_PARAM)
         )
 
+        # The GUI is read once and linked stages share the same objects,
+        # they are only replaced as a whole, never modified per stage.
+        metrics = self.ui.metricsTableWidget.getParametersFromGUI()
         stagesIterator = (
             range(len(stagesList))
             if self.ui.metricsTableWidget.linkStagesPushButton.checked
             else [currentStage]
         )
         for stageNumber in stagesIterator:
-            stagesList[stageNumber][
-                "metrics"
-            ] = self.ui.metricsTableWidget.getParametersFromGUI()
+            stagesList[stageNumber]["metrics"] = metrics
 
+        levels = self.ui.levelsTableWidget.getParametersFromGUI()
         stagesIterator = (
             range(len(stagesList))
             if self.ui.levelsTableWidget.linkStagesPushButton.checked
             else [currentStage]
         )
         for stageNumber in stagesIterator:
-            stagesList[stageNumber][
-                "levels"
-            ] = self.ui.levelsTableWidget.getParametersFromGUI()
+            stagesList[stageNumber]["levels"] = levels
 
+        masks = {
+            "fixed": self.ui.fixedMaskComboBox.currentNodeID,
+            "moving": self.ui.movingMaskComboBox.currentNodeID,
+        }
         stagesIterator = (
             range(len(stagesList))
             if self.ui.linkMaskingStagesPushButton.checked
             else [currentStage]
         )
         for stageNumber in stagesIterator:
-            stagesList[stageNumber]["masks"] = {
-                "fixed": self.ui.fixedMaskComboBox.currentNodeID,
-                "moving": self.ui.movingMaskComboBox.currentNodeID,
-            }
+            stagesList[stageNumber]["masks"] = masks
 
     def onRemoveStageButtonClicked(self):
-        stagesList = json.loads(
-            self._parameterNode.GetParameter(self.logic.params.STAGES_JSON_PARAM)
-        )
+        self.flushParameterNodeUpdate()
+        stagesList = self._getStages()
         if len(stagesList) == 1:
             return
         currentStage = int(
@@ -670,9 +869,7 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self._parameterNode.SetParameter(
             self.logic.params.CURRENT_STAGE_PARAM, str(max(currentStage - 1, 0))
         )
-        self._parameterNode.SetParameter(
-            self.logic.params.STAGES_JSON_PARAM, json.dumps(stagesList)
-        )
+        self._setStages(stagesList)
         self._parameterNode.EndModify(wasModified)
 
     def onPresetSelected(self, presetName):
@@ -682,30 +879,30 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             or self._updatingGUIFromParameterNode
         ):
             return
+        self.flushParameterNodeUpdate()
         wasModified = self._parameterNode.StartModify()  # Modify in a single batch
-        presetParameters = PresetManager().getPresetParametersByName(presetName)
+        presetParameters = self._presetManager.getPresetParametersByName(presetName)
         for stage in presetParameters["stages"]:
             stage["metrics"][0]["fixed"] = self.ui.fixedImageNodeComboBox.currentNodeID
             stage["metrics"][0][
                 "moving"
             ] = self.ui.movingImageNodeComboBox.currentNodeID
-        self._parameterNode.SetParameter(
-            self.logic.params.STAGES_JSON_PARAM, json.dumps(presetParameters["stages"])
-        )
+        self._setStages(presetParameters["stages"])
         self._parameterNode.SetParameter(self.logic.params.CURRENT_STAGE_PARAM, "0")
         self._parameterNode.EndModify(wasModified)
 
     def onSavePresetPushButton(self):
-        stages = json.loads(
+        self.flushParameterNodeUpdate()
+        # parsed separately from the cached stages, as the copy is modified below
+        stages = _loads(
             self._parameterNode.GetParameter(self.logic.params.STAGES_JSON_PARAM)
         )
         for stage in stages:
             for metric in stage["metrics"]:
-                metric["fixed"] = None
-                metric["moving"] = None
-            stage["masks"]["fixed"] = None
-            stage["masks"]["moving"] = None
-        savedPresetName = PresetManager().saveStagesAsPreset(stages)
+                metric["fixed"] = metric["moving"] = None
+            masks = stage["masks"]
+            masks["fixed"] = masks["moving"] = None
+        savedPresetName = self._presetManager.saveStagesAsPreset(stages)
         if savedPresetName:
             self._updatingGUIFromParameterNode = True
             self.ui.stagesPresetsComboBox.addItem(savedPresetName)
@@ -713,19 +910,14 @@ class ANTsRegistrationWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             self._updatingGUIFromParameterNode = False
 
     def onRunRegistrationButton(self):
+        self.flushParameterNodeUpdate()
         parameters = self.logic.createProcessParameters(self._parameterNode)
         self.logic.process(**parameters)
 
     def onOpenPresetsDirectoryButtonClicked(self):
-        import platform, subprocess
-
-        presetPath = PresetManager().presetPath
-        if platform.system() == "Windows":
-            os.startfile(presetPath)
-        elif platform.system() == "Darwin":
-            subprocess.Popen(["open", presetPath])
-        else:
-            subprocess.Popen(["xdg-open", presetPath])
+        qt.QDesktopServices.openUrl(
+            qt.QUrl.fromLocalFile(self._presetManager.presetPath)
+        )
 
 
 class ANTsRegistrationLogic(ITKANTsCommonLogic):
@@ -738,8 +930,10 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
     https://github.com/Slicer/Slicer/blob/main/Base/Python/slicer/ScriptedLoadableModule.py
     """
 
-    @dataclass
     class params:
+        """Names of the parameters and node references stored in the parameter node."""
+
+        __slots__ = ()
         OUTPUT_TRANSFORM_REF = "OutputTransform"
         OUTPUT_VOLUME_REF = "OutputVolume"
         INITIAL_TRANSFORM_REF = "InitialTransform"
@@ -752,12 +946,27 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
         HISTOGRAM_MATCHING_PARAM = "HistogramMatching"
         WINSORIZE_IMAGE_INTENSITIES_PARAM = "WinsorizeImageIntensities"
         COMPUTATION_PRECISION_PARAM = "ComputationPrecision"
+        ALL_REFS = (OUTPUT_TRANSFORM_REF, OUTPUT_VOLUME_REF, INITIAL_TRANSFORM_REF)
+        ALL_PARAMS = (
+            OUTPUT_INTERPOLATION_PARAM,
+            STAGES_JSON_PARAM,
+            CURRENT_STAGE_PARAM,
+            CREATE_DISPLACEMENT_FIELD_PARAM,
+            INITIALIZATION_FEATURE_PARAM,
+            DIMENSIONALITY_PARAM,
+            HISTOGRAM_MATCHING_PARAM,
+            WINSORIZE_IMAGE_INTENSITIES_PARAM,
+            COMPUTATION_PRECISION_PARAM,
+        )
 
     def __init__(self):
         """
         Called when the logic class is instantiated. Can be used for initializing member variables.
         """
         ITKANTsCommonLogic.__init__(self)
+        self._stagesCache = {}
+        self._itkImages = {}
+        self._inputArrays = []
         if slicer.util.settingsValue(
             "Developer/DeveloperMode", False, converter=slicer.util.toBool
         ):
@@ -767,7 +976,17 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
             antsRegistrationLibPath = os.path.join(
                 os.path.dirname(__file__), "antsRegistrationLib"
             )
-            G = glob.glob(os.path.join(antsRegistrationLibPath, "**", "*.py"))
+            # sorted, so that modules are reloaded after the ones they import from
+            # (e.g. delegates before tables)
+            G = sorted(glob.glob(os.path.join(antsRegistrationLibPath, "**", "*.py")))
+            modificationTimes = {g: os.path.getmtime(g) for g in G}
+            # modification times of the files when they were last reloaded, stored in the
+            # package so that they are kept when this module itself is reloaded
+            if (
+                antsRegistrationLib.__dict__.get("_reloadedModificationTimes")
+                == modificationTimes
+            ):
+                G = []  # unchanged since they were last reloaded
             for g in G:
                 relativePath = os.path.relpath(
                     g, antsRegistrationLibPath
@@ -783,97 +1002,133 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
                 ) in moduleParts:  # iterate over parts in order to load subpkgs
                     module = getattr(module, modulePart)
                 importlib.reload(module)  # reload
+            # all files are reloaded if any changed, so that modules importing from a changed one are rebound
+            antsRegistrationLib._reloadedModificationTimes = modificationTimes
 
     def setDefaultParameters(self, parameterNode):
         """
         Initialize parameter node with default settings.
         """
-        presetParameters = PresetManager().getPresetParametersByName()
-        if not parameterNode.GetParameter(self.params.STAGES_JSON_PARAM):
-            parameterNode.SetParameter(
-                self.params.STAGES_JSON_PARAM, json.dumps(presetParameters["stages"])
-            )
-        if not parameterNode.GetParameter(self.params.CURRENT_STAGE_PARAM):
-            parameterNode.SetParameter(self.params.CURRENT_STAGE_PARAM, "0")
-
-        if not parameterNode.GetNodeReference(self.params.OUTPUT_TRANSFORM_REF):
-            parameterNode.SetNodeReferenceID(self.params.OUTPUT_TRANSFORM_REF, "")
-        if not parameterNode.GetNodeReference(self.params.OUTPUT_VOLUME_REF):
-            parameterNode.SetNodeReferenceID(self.params.OUTPUT_VOLUME_REF, "")
-        if not parameterNode.GetParameter(self.params.OUTPUT_INTERPOLATION_PARAM):
-            parameterNode.SetParameter(
-                self.params.OUTPUT_INTERPOLATION_PARAM,
-                str(presetParameters["outputSettings"]["interpolation"]),
-            )
-        if not parameterNode.GetParameter(self.params.CREATE_DISPLACEMENT_FIELD_PARAM):
-            parameterNode.SetParameter(self.params.CREATE_DISPLACEMENT_FIELD_PARAM, "0")
-
-        if not parameterNode.GetParameter(self.params.INITIALIZATION_FEATURE_PARAM):
-            parameterNode.SetParameter(
-                self.params.INITIALIZATION_FEATURE_PARAM,
-                str(
-                    presetParameters["initialTransformSettings"][
-                        "initializationFeature"
-                    ]
-                ),
-            )
-        if not parameterNode.GetNodeReference(self.params.INITIAL_TRANSFORM_REF):
-            parameterNode.SetNodeReferenceID(self.params.INITIAL_TRANSFORM_REF, "")
+        wasModified = parameterNode.StartModify()  # Modify in a single batch
+        try:
+            presetParameters = PresetManager().getPresetParametersByName()
+            if not parameterNode.GetParameter(self.params.STAGES_JSON_PARAM):
+                self.setStages(parameterNode, presetParameters["stages"])
+            if not parameterNode.GetParameter(self.params.CURRENT_STAGE_PARAM):
+                parameterNode.SetParameter(self.params.CURRENT_STAGE_PARAM, "0")
+
+            if not parameterNode.GetNodeReference(self.params.OUTPUT_TRANSFORM_REF):
+                parameterNode.SetNodeReferenceID(self.params.OUTPUT_TRANSFORM_REF, "")
+            if not parameterNode.GetNodeReference(self.params.OUTPUT_VOLUME_REF):
+                parameterNode.SetNodeReferenceID(self.params.OUTPUT_VOLUME_REF, "")
+            if not parameterNode.GetParameter(self.params.OUTPUT_INTERPOLATION_PARAM):
+                parameterNode.SetParameter(
+                    self.params.OUTPUT_INTERPOLATION_PARAM,
+                    str(presetParameters["outputSettings"]["interpolation"]),
+                )
+            if not parameterNode.GetParameter(
+                self.params.CREATE_DISPLACEMENT_FIELD_PARAM
+            ):
+                parameterNode.SetParameter(
+                    self.params.CREATE_DISPLACEMENT_FIELD_PARAM, "0"
+                )
 
-        if not parameterNode.GetParameter(self.params.DIMENSIONALITY_PARAM):
-            parameterNode.SetParameter(
-                self.params.DIMENSIONALITY_PARAM,
-                str(presetParameters["generalSettings"]["dimensionality"]),
-            )
-        if not parameterNode.GetParameter(self.params.HISTOGRAM_MATCHING_PARAM):
-            parameterNode.SetParameter(
-                self.params.HISTOGRAM_MATCHING_PARAM,
-                str(presetParameters["generalSettings"]["histogramMatching"]),
-            )
-        if not parameterNode.GetParameter(
-            self.params.WINSORIZE_IMAGE_INTENSITIES_PARAM
-        ):
-            parameterNode.SetParameter(
-                self.params.WINSORIZE_IMAGE_INTENSITIES_PARAM,
-                ",".join(
-                    [
-                        str(x)
-                        for x in presetParameters["generalSettings"][
-                            "winsorizeImageIntensities"
+            if not parameterNode.GetParameter(self.params.INITIALIZATION_FEATURE_PARAM):
+                parameterNode.SetParameter(
+                    self.params.INITIALIZATION_FEATURE_PARAM,
+                    str(
+                        presetParameters["initialTransformSettings"][
+                            "initializationFeature"
                         ]
-                    ]
-                ),
-            )
-        if not parameterNode.GetParameter(self.params.COMPUTATION_PRECISION_PARAM):
-            parameterNode.SetParameter(
-                self.params.COMPUTATION_PRECISION_PARAM,
-                presetParameters["generalSettings"]["computationPrecision"],
-            )
+                    ),
+                )
+            if not parameterNode.GetNodeReference(self.params.INITIAL_TRANSFORM_REF):
+                parameterNode.SetNodeReferenceID(self.params.INITIAL_TRANSFORM_REF, "")
+
+            if not parameterNode.GetParameter(self.params.DIMENSIONALITY_PARAM):
+                parameterNode.SetParameter(
+                    self.params.DIMENSIONALITY_PARAM,
+                    str(presetParameters["generalSettings"]["dimensionality"]),
+                )
+            if not parameterNode.GetParameter(self.params.HISTOGRAM_MATCHING_PARAM):
+                parameterNode.SetParameter(
+                    self.params.HISTOGRAM_MATCHING_PARAM,
+                    str(presetParameters["generalSettings"]["histogramMatching"]),
+                )
+            if not parameterNode.GetParameter(
+                self.params.WINSORIZE_IMAGE_INTENSITIES_PARAM
+            ):
+                parameterNode.SetParameter(
+                    self.params.WINSORIZE_IMAGE_INTENSITIES_PARAM,
+                    ",".join(
+                        [
+                            str(x)
+                            for x in presetParameters["generalSettings"][
+                                "winsorizeImageIntensities"
+                            ]
+                        ]
+                    ),
+                )
+            if not parameterNode.GetParameter(self.params.COMPUTATION_PRECISION_PARAM):
+                parameterNode.SetParameter(
+                    self.params.COMPUTATION_PRECISION_PARAM,
+                    presetParameters["generalSettings"]["computationPrecision"],
+                )
+        finally:
+            parameterNode.EndModify(wasModified)
+
+    def getStages(self, paramNode, stagesJson=None):
+        """
+        Return the stages list of the parameter node, or parsed from stagesJson if it was already read.
+        The parsed list is cached for each parameter node and only parsed again when the JSON string changed.
+        The list is shared with other callers, copy it before modifying it without calling setStages.
+        """
+        if stagesJson is None:
+            stagesJson = paramNode.GetParameter(self.params.STAGES_JSON_PARAM)
+        cached = self._stagesCache.get(paramNode.GetID())
+        if cached is None or cached[0] != stagesJson:
+            cached = (stagesJson, _loads(stagesJson))
+            self._stagesCache[paramNode.GetID()] = cached
+        return cached[1]
+
+    def setStages(self, paramNode, stages):
+        """
+        Store the stages list in the parameter node and keep it as the cached parsed stages.
+        """
+        stagesJson = _dumps(stages)
+        # update the cache first, setting the parameter triggers a GUI update that reads it
+        self._stagesCache[paramNode.GetID()] = (stagesJson, stages)
+        paramNode.SetParameter(self.params.STAGES_JSON_PARAM, stagesJson)
 
     def createProcessParameters(self, paramNode):
         parameters = {}
-        parameters["stages"] = json.loads(
-            paramNode.GetParameter(self.params.STAGES_JSON_PARAM)
-        )
+        # copied, as the node IDs are replaced by the nodes below
+        parameters["stages"] = copy.deepcopy(self.getStages(paramNode))
+
+        # ID to Node, each node is only looked up once as most stages use the same images
+        nodes = {}
+
+        def getNode(nodeID):
+            if not nodeID:
+                return ""
+            if nodeID not in nodes:
+                nodes[nodeID] = slicer.util.getNode(nodeID)
+            return nodes[nodeID]
 
-        # ID to Node
         for stage in parameters["stages"]:
-            for metric in stage["metrics"]:
-                metric["fixed"] = (
-                    slicer.util.getNode(metric["fixed"]) if metric["fixed"] else ""
+            # new dicts instead of updating them in place, linked stages share them
+            stage["metrics"] = [
+                dict(
+                    metric,
+                    fixed=getNode(metric["fixed"]),
+                    moving=getNode(metric["moving"]),
                 )
-                metric["moving"] = (
-                    slicer.util.getNode(metric["moving"]) if metric["moving"] else ""
-                )
-            stage["masks"]["fixed"] = (
-                slicer.util.getNode(stage["masks"]["fixed"])
-                if stage["masks"]["fixed"]
-                else ""
-            )
-            stage["masks"]["moving"] = (
-                slicer.util.getNode(stage["masks"]["moving"])
-                if stage["masks"]["moving"]
-                else ""
+                for metric in stage["metrics"]
+            ]
+            stage["masks"] = dict(
+                stage["masks"],
+                fixed=getNode(stage["masks"]["fixed"]),
+                moving=getNode(stage["masks"]["moving"]),
             )
 
         parameters["outputSettings"] = {}
@@ -917,6 +1172,34 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
 
         return parameters
 
+    @staticmethod
+    def parseStageSettings(stage):
+        """
+        Convert the comma separated settings strings and the levels of the stage
+        into the values that are passed to the registration filter.
+        """
+        transformSettings = stage["transformParameters"]["settings"].split(",")
+        metricSettings = stage["metrics"][0]["settings"].split(",")
+        samplingRate = None
+        # the sampling strategy itself is not exposed by the filter,
+        # so "None" (dense sampling) is expressed as a full sampling rate
+        if len(metricSettings) > 2 and metricSettings[2] == "None":
+            samplingRate = 1.0
+        elif len(metricSettings) > 3:
+            samplingRate = float(metricSettings[3])
+        steps = stage["levels"]["steps"] or DEFAULT_LEVEL_STEPS
+        return {
+            "gradientStep": float(transformSettings[0]),
+            "metricParameter": int(metricSettings[1]),
+            "samplingRate": samplingRate,
+            "useGradientFilter": (
+                bool(metricSettings[4]) if len(metricSettings) > 4 else None
+            ),
+            "iterations": tuple(step["convergence"] for step in steps),
+            "shrinkFactors": tuple(step["shrinkFactors"] for step in steps),
+            "sigmas": tuple(step["smoothingSigmas"] for step in steps),
+        }
+
     def process(
         self,
         stages,
@@ -929,7 +1212,10 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
         :param stages: list defining registration stages
         :param outputSettings: dictionary defining output settings
         :param initialTransformSettings: dictionary defining initial moving transform
-        :param generalSettings: dictionary defining general registration settings
+        :param generalSettings: dictionary defining general registration settings,
+          optionally including "numberOfThreads" (defaults to the ITK global default)
+          and "backend" ("itk" by default, or "fireants"/"gpu" to run Rigid, Affine
+          and SyN stages on a CUDA GPU)
         :param wait_for_completion: flag to enable waiting for completion
         See presets examples to see how these are specified
         """
@@ -939,79 +1225,90 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
         if initialTransformSettings is None:
             initialTransformSettings = {}
 
-        logging.info("Instantiating the filter")
-        slicer.app.processEvents()
+        if generalSettings.get("backend", "itk") in ("fireants", "gpu"):
+            if self.canProcessWithFireANTs(stages, initialTransformSettings):
+                return self.processWithFireANTs(stages, outputSettings)
+            logger.warning(
+                "FireANTs backend requires the fireants package, a CUDA device and"
+                " at most one Rigid, Affine and SyN stage each, in this order,"
+                " without masks or an initial transform, falling back to ITK"
+            )
+
+        logger.info("Instantiating the filter")
         itk = self.itk
         precision_type = itk.F
         if generalSettings["computationPrecision"] == "double":
             precision_type = itk.D
-        fixedImage = slicer.util.itkImageFromVolume(stages[0]["metrics"][0]["fixed"])
-        movingImage = slicer.util.itkImageFromVolume(stages[0]["metrics"][0]["moving"])
+        self._itkImages = {}
+        self._inputArrays = []
+        # float pixels halve the memory traffic of the metric compared to double
+        fixedImage = self._itkImageFromVolume(stages[0]["metrics"][0]["fixed"], itk.F)
+        movingImage = self._itkImageFromVolume(stages[0]["metrics"][0]["moving"], itk.F)
 
         initial_itk_transform = itk.AffineTransform[precision_type, fixedImage.ndim].New()  # not wrapped for float in 5.3
         initial_itk_transform.SetIdentity()
         if "initialTransformNode" in initialTransformSettings:
-            print("Passing Slicer nodes to ITK filters is not yet implemented")
+            logger.warning("Passing Slicer nodes to ITK filters is not yet implemented")
             # initial_itk_transform = itkTransformFromTransformNode(initialTransformSettings["initialTransformNode"])
         elif "initializationFeature" in initialTransformSettings:
-            print("This initialization is not yet implemented")
+            logger.warning("This initialization is not yet implemented")
             # use itk.CenteredTransformInitializer to construct initial transform
 
-        slicer.app.processEvents()
-        startTime = time.time()
-        ants_reg = itk.ANTSRegistration[type(fixedImage), type(movingImage), precision_type].New()
+        startTime = time.perf_counter()
+        ants_reg = self.antsRegistrationClass(
+            type(fixedImage), type(movingImage), precision_type
+        ).New()
+        # the fixed and moving images do not change between stages
+        ants_reg.SetFixedImage(fixedImage)
+        ants_reg.SetMovingImage(movingImage)
+        numberOfThreads = generalSettings.get("numberOfThreads")
+        if numberOfThreads:
+            ants_reg.SetNumberOfWorkUnits(numberOfThreads)
+        assert fixedImage.ndim == movingImage.ndim
+        assert fixedImage.ndim == generalSettings["dimensionality"]
+        ants_reg.SetInitialTransform(initial_itk_transform)
         for stage_index, stage in enumerate(stages):
-            ants_reg.SetFixedImage(fixedImage)
-            ants_reg.SetMovingImage(movingImage)
-            ants_reg.SetInitialTransform(initial_itk_transform)
-            assert fixedImage.ndim == movingImage.ndim
-            assert fixedImage.ndim == generalSettings["dimensionality"]
+            if stage_index > 0:
+                # continue from the transform of the previous stage
+                ants_reg.SetInitialTransform(initial_itk_transform)
             # currently unexposed parameters
             # generalSettings["winsorizeImageIntensities"]
             # generalSettings["histogramMatching"]
             # outputSettings["interpolation"]
             # outputSettings["useDisplacementField"]
-            logging.info(f"Stage {stage_index} started")
+            logger.info("Stage %d started", stage_index)
+            assert len(stage["metrics"]) == 1
+            metric = stage["metrics"][0]
+            levels = stage["levels"]
+            masks = stage["masks"]
 
             transform_type = stage["transformParameters"]["transform"]
             if transform_type == "SyN":
                 transform_type = "SyNOnly"
             ants_reg.SetTypeOfTransform(transform_type)
-            transform_settings = stage["transformParameters"]["settings"].split(",")
-            ants_reg.SetGradientStep(float(transform_settings[0]))
+            parsed = self.parseStageSettings(stage)
+            ants_reg.SetGradientStep(parsed["gradientStep"])
             # TODO: other parameters depend on the type of transform, see
             # https://github.com/ANTsX/ANTs/blob/beb4aa2e9456445249de6ae6698e3f6ed8c4767b/Examples/antsRegistration.cxx#L370-L391
 
-            assert len(stage["metrics"]) == 1
-            metric_type = stage["metrics"][0]["type"]
+            metric_type = metric["type"]
 
-            metric_settings = stage["metrics"][0]["settings"].split(",")
             if metric_type in ["MI", "Mattes"]:
-                ants_reg.SetNumberOfBins(int(metric_settings[1]))
+                ants_reg.SetNumberOfBins(parsed["metricParameter"])
             else:
-                ants_reg.SetRadius(int(metric_settings[1]))
-            # if len(metric_settings) > 2:
-            #     ants_reg.SetSamplingStrategy(metric_settings[2])  # not exposed
-            if len(metric_settings) > 3:
-                ants_reg.SetSamplingRate(float(metric_settings[3]))
-            if len(metric_settings) > 4:
-                ants_reg.SetUseGradientFilter(bool(metric_settings[4]))
-
-            iterations = []
-            shrink_factors = []
-            sigmas = []
-            for step in stage["levels"]["steps"]:
-                iterations.append(step["convergence"])
-                shrink_factors.append(step["shrinkFactors"])
-                sigmas.append(step["smoothingSigmas"])
-            ants_reg.SetShrinkFactors(shrink_factors)
-            ants_reg.SetSmoothingSigmas(sigmas)
-            ants_reg.SetSmoothingInPhysicalUnits(
-                stage["levels"]["smoothingSigmasUnit"] == "mm"
-            )
+                ants_reg.SetRadius(parsed["metricParameter"])
+            if parsed["samplingRate"] is not None:
+                ants_reg.SetSamplingRate(parsed["samplingRate"])
+            if parsed["useGradientFilter"] is not None:
+                ants_reg.SetUseGradientFilter(parsed["useGradientFilter"])
+
+            iterations = parsed["iterations"]
+            ants_reg.SetShrinkFactors(parsed["shrinkFactors"])
+            ants_reg.SetSmoothingSigmas(parsed["sigmas"])
+            ants_reg.SetSmoothingInPhysicalUnits(levels["smoothingSigmasUnit"] == "mm")
             # not exposed:
-            # stage["levels"]["smoothingSigmasUnit"]
-            # stage["levels"]["convergenceThreshold"]
+            # levels["convergenceThreshold"]
+            # levels["convergenceWindowSize"]
 
             if transform_type in [
                 "Rigid",
@@ -1026,14 +1323,13 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
                 ants_reg.SetSynMetric(metric_type)
                 ants_reg.SetSynIterations(iterations)
 
-            if stage["masks"]["fixed"] is not None and stage["masks"]["fixed"] != "":
-                ants_reg.SetFixedImageMask(
-                    slicer.util.itkImageFromVolume(stage["masks"]["fixed"])
-                )
-            if stage["masks"]["moving"] is not None and stage["masks"]["moving"] != "":
-                ants_reg.SetMovingImageMask(
-                    slicer.util.itkImageFromVolume(stage["masks"]["moving"])
-                )
+            # masks are always set, so none is left over from a previous stage
+            ants_reg.SetFixedImageMask(
+                self._itkImageFromVolume(masks["fixed"]) if masks["fixed"] else None
+            )
+            ants_reg.SetMovingImageMask(
+                self._itkImageFromVolume(masks["moving"]) if masks["moving"] else None
+            )
 
             ants_reg.Update()
             initial_itk_transform = ants_reg.GetForwardTransform()
@@ -1041,20 +1337,163 @@ class ANTsRegistrationLogic(ITKANTsCommonLogic):
             # TODO: update progress bar
 
         outTransform = ants_reg.GetForwardTransform()
-        print(outTransform)
-        slicer.app.processEvents()
+        # printing the transform itself would serialize whole displacement fields
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Output transform: %s with %d parameters",
+                type(outTransform).__name__,
+                outTransform.GetNumberOfParameters(),
+            )
         if outputSettings["transform"] is not None:
             transformNodeFromItkTransform(outTransform, outputSettings["transform"])
 
         if outputSettings["volume"] is not None:
             itkImage = ants_reg.GetWarpedMovingImage()
-            slicer.util.updateVolumeFromITKImage(outputSettings["volume"], itkImage)
+            # the warped image is on the fixed image grid, so only the voxels are passed on,
+            # through a view instead of a copy of the ITK buffer
+            slicer.util.updateVolumeFromArray(
+                outputSettings["volume"], itk.GetArrayViewFromImage(itkImage)
+            )
+            outputSettings["volume"].CopyOrientation(stages[0]["metrics"][0]["fixed"])
+            slicer.util.setSliceViewerLayers(
+                background=outputSettings["volume"], fit=True, rotateToVolumePlane=True
+            )
+
+        self._itkImages = {}
+        self._inputArrays = []
+        elapsed = time.perf_counter() - startTime
+        logger.info("Processing completed in %.2f seconds", elapsed)
+
+    @staticmethod
+    def canProcessWithFireANTs(stages, initialTransformSettings=None):
+        transforms = [stage["transformParameters"]["transform"] for stage in stages]
+        if (
+            not transforms
+            or transforms != [t for t in FIREANTS_TRANSFORMS if t in transforms]
+            or any(
+                stage["metrics"][0]["type"] not in FIREANTS_LOSS_TYPES
+                for stage in stages
+            )
+            # FireANTs would ignore these
+            or any(stage["masks"]["fixed"] or stage["masks"]["moving"] for stage in stages)
+            or (initialTransformSettings or {}).get("initialTransformNode")
+            or not _HAS_FIREANTS
+        ):
+            return False
+        import torch
+
+        return torch.cuda.is_available()
+
+    def processWithFireANTs(self, stages, outputSettings):
+        """Run a chain of Rigid, Affine and SyN stages on the GPU using FireANTs."""
+        import sitkUtils
+        from fireants.io import Image, BatchedImages
+        from fireants.registration import (
+            RigidRegistration,
+            AffineRegistration,
+            SyNRegistration,
+        )
+
+        registrationClasses = {
+            "Rigid": RigidRegistration,
+            "Affine": AffineRegistration,
+            "SyN": SyNRegistration,
+        }
+        startTime = time.perf_counter()
+        fixedNode = stages[0]["metrics"][0]["fixed"]
+        fixedImages = BatchedImages(
+            [Image(sitkUtils.PullVolumeFromSlicer(fixedNode))]
+        )
+        movingImages = BatchedImages(
+            [Image(sitkUtils.PullVolumeFromSlicer(stages[0]["metrics"][0]["moving"]))]
+        )
+
+        reg = None
+        for stage_index, stage in enumerate(stages):
+            logger.info("Stage %d started (FireANTs)", stage_index)
+            transform_type = stage["transformParameters"]["transform"]
+            parsed = self.parseStageSettings(stage)
+            if any(parsed["sigmas"]):
+                logger.warning(
+                    "Stage %d: FireANTs does not use the smoothing sigmas %s",
+                    stage_index,
+                    parsed["sigmas"],
+                )
+            loss_type = FIREANTS_LOSS_TYPES[stage["metrics"][0]["type"]]
+            options = {}
+            if loss_type == "cc":
+                options["cc_kernel_size"] = 2 * parsed["metricParameter"] + 1
+            # each stage starts from the result of the previous one
+            if isinstance(reg, RigidRegistration):
+                initMatrix = reg.get_rigid_matrix().detach()
+                if transform_type == "Affine":
+                    options["init_rigid"] = initMatrix
+                else:
+                    options["init_affine"] = initMatrix
+            elif isinstance(reg, AffineRegistration):
+                options["init_affine"] = reg.get_affine_matrix().detach()
+            reg = registrationClasses[transform_type](
+                scales=parsed["shrinkFactors"],
+                iterations=parsed["iterations"],
+                fixed_images=fixedImages,
+                moving_images=movingImages,
+                loss_type=loss_type,
+                optimizer="Adam",
+                optimizer_lr=parsed["gradientStep"],
+                **options,
+            )
+            reg.optimize(save_transformed=False)
+            slicer.app.processEvents()
+
+        if outputSettings["transform"] is not None:
+            # the SyN stage includes the linear stages before it in its displacement field
+            extension = ".nii.gz" if isinstance(reg, SyNRegistration) else ".mat"
+            with temporaryTransformFilePath(extension) as tempFilePath:
+                reg.save_as_ants_transforms(tempFilePath)
+                storageNode = slicer.vtkMRMLTransformStorageNode()
+                storageNode.SetFileName(tempFilePath)
+                storageNode.ReadData(outputSettings["transform"], True)
+
+        if outputSettings["volume"] is not None:
+            warped = reg.evaluate(fixedImages, movingImages)
+            slicer.util.updateVolumeFromArray(
+                outputSettings["volume"], warped[0, 0].detach().cpu().numpy()
+            )
+            outputSettings["volume"].CopyOrientation(fixedNode)
             slicer.util.setSliceViewerLayers(
                 background=outputSettings["volume"], fit=True, rotateToVolumePlane=True
             )
 
-        stopTime = time.time()
-        logging.info(f"Processing completed in {stopTime-startTime:.2f} seconds")
+        elapsed = time.perf_counter() - startTime
+        logger.info("Processing completed in %.2f seconds", elapsed)
+
+    def _itkImageFromVolume(self, volumeNode, pixelType=None):
+        """Import the volume into ITK once per process() call, optionally casting its pixels.
+        The same volume is often used as input of several stages (e.g. linked masks).
+        """
+        key = (volumeNode.GetID(), pixelType)
+        if key not in self._itkImages:
+            image, array = itkImageViewFromVolume(volumeNode)
+            if pixelType is not None:
+                itk = self.itk
+                outputImageType = itk.Image[pixelType, image.ndim]
+                if type(image) != outputImageType:
+                    castFilter = itk.CastImageFilter[type(image), outputImageType].New(
+                        Input=image
+                    )
+                    castFilter.Update()
+                    # the cast output owns its own buffer, the view is no longer needed
+                    image = castFilter.GetOutput()
+                    array = None
+            if array is not None:
+                self._inputArrays.append(array)  # keep the viewed buffer alive during Update()
+            self._itkImages[key] = image
+        return self._itkImages[key]
+
+
+# Parsed preset files and preset directory listings, as (modification time, content) keyed by path
+_PRESET_CACHE = {}
+_PRESET_NAMES_CACHE = {}
 
 
 class PresetManager:
@@ -1063,6 +1502,10 @@ class PresetManager:
             os.path.dirname(__file__), "Resources", "Presets"
         )
 
+    def refresh(self):
+        """Forget the listed preset names, the presets directory is listed again when they are needed."""
+        _PRESET_NAMES_CACHE.pop(self.presetPath, None)
+
     def saveStagesAsPreset(self, stages):
         from PythonQt import BoolResult
 
@@ -1085,23 +1528,40 @@ class PresetManager:
         outFilePath = os.path.join(self.presetPath, f"{presetName}.json")
         saveSettings = self.getPresetParametersByName()
         saveSettings["stages"] = stages
+        # written next to the preset and then renamed, so an interrupted save leaves no partial preset
+        tempFilePath = outFilePath + ".tmp"
         try:
-            with open(outFilePath, "w") as outfile:
-                json.dump(saveSettings, outfile)
+            with open(tempFilePath, "w") as outfile:
+                outfile.write(_dumps(saveSettings))
+            os.replace(tempFilePath, outFilePath)
         except:
+            if os.path.exists(tempFilePath):
+                os.remove(tempFilePath)
             slicer.util.warningDisplay(f"Unable to write into {outFilePath}")
             return
+        self.refresh()
         slicer.util.infoDisplay(f"Saved preset to {outFilePath}.")
         return presetName
 
     def getPresetParametersByName(self, name="Rigid"):
         presetFilePath = os.path.join(self.presetPath, name + ".json")
-        with open(presetFilePath) as presetFile:
-            return json.load(presetFile)
+        mtime = os.stat(presetFilePath).st_mtime
+        cached = _PRESET_CACHE.get(presetFilePath)
+        if cached is None or cached[0] != mtime:
+            with open(presetFilePath, "rb") as presetFile:
+                cached = (mtime, _loads(presetFile.read()))
+            _PRESET_CACHE[presetFilePath] = cached
+        # callers modify the returned parameters
+        return copy.deepcopy(cached[1])
 
     def getPresetNames(self):
-        G = glob.glob(os.path.join(self.presetPath, "*.json"))
-        return [os.path.splitext(os.path.basename(g))[0] for g in G]
+        mtime = os.stat(self.presetPath).st_mtime
+        cached = _PRESET_NAMES_CACHE.get(self.presetPath)
+        if cached is None or cached[0] != mtime:
+            G = glob.glob(os.path.join(self.presetPath, "*.json"))
+            cached = (mtime, [os.path.splitext(os.path.basename(g))[0] for g in G])
+            _PRESET_NAMES_CACHE[self.presetPath] = cached
+        return list(cached[1])
 
 
 class ANTsRegistrationTest(ScriptedLoadableModuleTest):
@@ -1111,6 +1571,20 @@ class ANTsRegistrationTest(ScriptedLoadableModuleTest):
     https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
     """
 
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def sampleDataFilePath(sampleName):
+        """Download the sample data file into the cache once per session and return its path.
+        Paths remain valid when the scene is cleared between tests, unlike node IDs.
+        """
+        import SampleData
+
+        sampleDataLogic = SampleData.SampleDataLogic()
+        source = sampleDataLogic.sourceForSampleName(sampleName)
+        return sampleDataLogic.downloadFileIntoCache(
+            source.uris[0], source.fileNames[0], source.checksums[0]
+        )
+
     def setUp(self):
         """Do whatever is needed to reset the state - typically a scene clear will be enough."""
         slicer.mrmlScene.Clear()
@@ -1136,11 +1610,8 @@ class ANTsRegistrationTest(ScriptedLoadableModuleTest):
 
         # Get/create input data
 
-        import SampleData
-
-        sampleDataLogic = SampleData.SampleDataLogic()
-        fixed = sampleDataLogic.downloadMRBrainTumor1()
-        moving = sampleDataLogic.downloadMRBrainTumor2()
+        fixed = slicer.util.loadVolume(self.sampleDataFilePath("MRBrainTumor1"))
+        moving = slicer.util.loadVolume(self.sampleDataFilePath("MRBrainTumor2"))
 
         initialTransform = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
         outputTransform = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLTransformNode")
@@ -1166,4 +1637,11 @@ class ANTsRegistrationTest(ScriptedLoadableModuleTest):
 
         logic.process(**presetParameters)
 
+        # read the voxels once and reduce them in numpy instead of asking VTK for the scalar range
+        outputArray = slicer.util.arrayFromVolume(outputVolume)
+        outputScalarRange = (float(outputArray.min()), float(outputArray.max()))
+        self.assertLess(outputScalarRange[0], outputScalarRange[1])
+        # the warped moving image is resampled onto the fixed image grid
+        self.assertEqual(outputArray.shape, slicer.util.arrayFromVolume(fixed).shape)
+
         self.delayDisplay("Test passed!")
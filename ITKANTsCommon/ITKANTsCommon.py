@@ -42,21 +42,42 @@ class ITKANTsCommonLogic(ScriptedLoadableModuleLogic):
     https://github.com/Slicer/Slicer/blob/main/Base/Python/slicer/ScriptedLoadableModule.py
     """
 
+    # Shared by all logic instances, importing itk and resolving templates is slow
+    _itk = None
+    _antsRegTemplates = {}
+
     def __init__(self):
         """
         Called when the logic class is instantiated. Can be used for initializing member variables.
         """
         ScriptedLoadableModuleLogic.__init__(self)
-        self._itk = None
 
     @property
     def itk(self):
-        if self._itk is None:
+        if ITKANTsCommonLogic._itk is None:
             logging.info("Importing itk...")
-            self._itk = self.importITK()
-        return self._itk
+            ITKANTsCommonLogic._itk = self.importITK()
+        return ITKANTsCommonLogic._itk
+
+    def antsRegistrationClass(self, fixedImageType, movingImageType, precisionType):
+        """Return the itk.ANTSRegistration instantiation for these types, resolving it only once."""
+        key = (fixedImageType, movingImageType, precisionType)
+        templateClass = ITKANTsCommonLogic._antsRegTemplates.get(key)
+        if templateClass is None:
+            templateClass = self.itk.ANTSRegistration[key]
+            ITKANTsCommonLogic._antsRegTemplates[key] = templateClass
+        return templateClass
+
+    @staticmethod
+    def defaultNumberOfThreads():
+        """All but one of the CPU cores, so that the application stays responsive."""
+        return max(1, (os.cpu_count() or 1) - 1)
 
     def importITK(self, confirmInstallation=True):
+        # ITK only reads this variable when it is first imported
+        os.environ.setdefault(
+            "ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS", str(self.defaultNumberOfThreads())
+        )
         try:
             import itk
         except ModuleNotFoundError:
@@ -64,6 +85,16 @@ class ITKANTsCommonLogic(ScriptedLoadableModuleLogic):
                 itk = self.installITK(confirmInstallation)
                 if itk is None:
                     return None
+        # itk may have been imported before, e.g. by another module, without the variable
+        try:
+            numberOfThreads = int(os.environ["ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS"])
+        except ValueError:
+            logging.warning(
+                "Ignoring invalid ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS value: "
+                + os.environ["ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS"]
+            )
+        else:
+            itk.MultiThreaderBase.SetGlobalDefaultNumberOfThreads(numberOfThreads)
         logging.info(f"ITK {itk.__version__} imported correctly")
         return itk
 